@@ -1,5 +1,10 @@
 import os
+import atexit
 import logging
+import threading
+from queue import Queue
+import cv2
+import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime
 from .. import config
@@ -17,10 +22,44 @@ class ImgWriter:
         self.fileconv = self.output_dict["FileName"]
         self.filename = None
         
+        # encoding and disk I/O run on a background thread, started on first write
+        self.queue = Queue()
+        self.thread = None
+        
     def write(self, ID, fallcount):
         self.filename = self.getFileName(ID, fallcount)
-        plt.savefig(self.filename)
-        LOG.info("Frame written: {}".format(self.filename))
+        
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+        
+        # matplotlib is not thread-safe: render the current figure here
+        fig = plt.gcf()
+        fig.canvas.draw()
+        rgba = np.asarray(fig.canvas.buffer_rgba()).copy()
+        
+        self.queue.put((self.filename, rgba))
+        
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            
+            filename, rgba = item
+            try:
+                if cv2.imwrite(filename, cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)):
+                    LOG.info("Frame written: {}".format(filename))
+                else:
+                    LOG.error("Failed to write frame: {}".format(filename))
+            except Exception:
+                LOG.exception("Failed to write frame: {}".format(filename))
+        
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
         
     def getFileName(self, ID, fallcount):
         str_filename = "".join(self.fileconv)
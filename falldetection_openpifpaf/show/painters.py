@@ -9,6 +9,7 @@ try:
     import matplotlib.collections
     import matplotlib.patches
     import matplotlib.pyplot as plt
+    import matplotlib.text
 except ImportError:
     matplotlib = None
 
@@ -17,6 +18,27 @@ from .. import core
 LOG = logging.getLogger(__name__)
 
 
+def _tab20_colors():
+    if matplotlib is None:
+        return None
+    return matplotlib.cm.get_cmap('tab20')((np.arange(20) + 0.05) / 20)
+
+
+def _draw_boxes(ax, boxes, colors, linewidth=1.0):
+    if not len(boxes):
+        return
+
+    x, y, w, h = np.asarray(boxes).T
+    verts = np.stack([
+        np.stack([x, y], -1),
+        np.stack([x + w, y], -1),
+        np.stack([x + w, y + h], -1),
+        np.stack([x, y + h], -1),
+    ], 1)
+    ax.add_collection(matplotlib.collections.PolyCollection(
+        verts, facecolors='none', edgecolors=colors, linewidths=linewidth))
+
+
 class AnnotationPainter:
     def __init__(self, *,
                  xy_scale=1.0,
@@ -28,20 +50,33 @@ class AnnotationPainter:
             'AnnotationCrowd': crowd_painer or CrowdPainter(),  # TODO update
             'AnnotationDet': detection_painter or DetectionPainter(xy_scale=xy_scale),
         }
+        # painters resolved by annotation class on first use
+        self._painter_by_class = {}
 
     def annotations(self, ax, annotations, ID, fps, *,
                     color=None, colors=None, texts=None, subtexts=None):
         fallcount = None
-        by_classname = defaultdict(list)
+        indices_by_class = defaultdict(list)
         for ann_i, ann in enumerate(annotations):
-            by_classname[ann.__class__.__name__].append((ann_i, ann))
-
-        for classname, i_anns in by_classname.items():
-            anns = [ann for _, ann in i_anns]
-            this_colors = [colors[i] for i, _ in i_anns] if colors else None
-            this_texts = [texts[i] for i, _ in i_anns] if texts else None
-            this_subtexts = [subtexts[i] for i, _ in i_anns] if subtexts else None
-            fallcount = self.painters[classname].annotations(
+            indices_by_class[type(ann)].append(ann_i)
+
+        for cls, indices in indices_by_class.items():
+            painter = self._painter_by_class.get(cls)
+            if painter is None:
+                painter = self._painter_by_class[cls] = self.painters[cls.__name__]
+
+            if len(indices_by_class) == 1:
+                # single class: pass through without regrouping
+                anns = annotations
+                this_colors = colors or None
+                this_texts = texts or None
+                this_subtexts = subtexts or None
+            else:
+                anns = [annotations[i] for i in indices]
+                this_colors = [colors[i] for i in indices] if colors else None
+                this_texts = [texts[i] for i in indices] if texts else None
+                this_subtexts = [subtexts[i] for i in indices] if subtexts else None
+            fallcount = painter.annotations(
                 ax, anns, ID, fps,
                 color=color, colors=this_colors, texts=this_texts, subtexts=this_subtexts)
 
@@ -51,9 +86,11 @@ class AnnotationPainter:
 class DetectionPainter:
     def __init__(self, *, xy_scale=1.0):
         self.xy_scale = xy_scale
+        self._tab20 = _tab20_colors()
 
     def annotations(self, ax, annotations, *,
                     color=None, colors=None, texts=None, subtexts=None):
+        boxes, box_colors, labels = [], [], []
         for i, ann in reversed(list(enumerate(annotations))):
             this_color = ann.field_i
             if colors is not None:
@@ -75,28 +112,41 @@ class DetectionPainter:
             elif ann.score is not None:
                 subtext = '{:.0%}'.format(ann.score)
 
-            self.annotation(ax, ann, color=this_color, text=text, subtext=subtext)
+            boxes.append(self._bbox(ann))
+            box_colors.append(self._color(this_color))
+            labels.append((text, subtext))
+
+        # draw all boxes with a single artist
+        _draw_boxes(ax, boxes, box_colors)
+
+        for (x, y, _, __), this_color, (text, subtext) in zip(boxes, box_colors, labels):
+            self._draw_text(ax, x, y, text, this_color, subtext=subtext)
 
     def annotation(self, ax, ann, *, color=None, text=None, subtext=None):
-        if color is None:
-            color = 0
-        if isinstance(color, (int, np.integer)):
-            color = matplotlib.cm.get_cmap('tab20')((color % 20 + 0.05) / 20)
+        self.annotations(ax, [ann], colors=[color], texts=[text], subtexts=[subtext])
 
-        x, y, w, h = ann.bbox * self.xy_scale
+    def _bbox(self, ann):
+        x, y, w, h = np.asarray(ann.bbox, dtype=np.float32) * self.xy_scale
         if w < 5.0:
             x -= 2.0
             w += 4.0
         if h < 5.0:
             y -= 2.0
             h += 4.0
+        return x, y, w, h
 
-        # draw box
-        ax.add_patch(
-            matplotlib.patches.Rectangle(
-                (x, y), w, h, fill=False, color=color, linewidth=1.0))
+    def _color(self, color):
+        if color is None:
+            color = 0
+        if isinstance(color, (int, np.integer)):
+            color = self._tab20[color % 20]
+        return color
 
-        # draw text
+    @staticmethod
+    def _draw_text(ax, x, y, text, color, *, subtext=None):
+        # subtext goes on a line above the text within the same artist
+        if subtext is not None:
+            text = subtext if text is None else '{}\n{}'.format(subtext, text)
         ax.annotate(
             text,
             (x, y),
@@ -105,15 +155,6 @@ class DetectionPainter:
             textcoords='offset points',
             color='white', bbox={'facecolor': color, 'alpha': 0.5, 'linewidth': 0},
         )
-        if subtext is not None:
-            ax.annotate(
-                subtext,
-                (x, y),
-                fontsize=5,
-                xytext=(5.0, 18.0 + 3.0),
-                textcoords='offset points',
-                color='white', bbox={'facecolor': color, 'alpha': 0.5, 'linewidth': 0},
-            )
 
 
 class CrowdPainter:
@@ -159,12 +200,25 @@ class KeypointPainter:
         self.color_connections = color_connections
         self.solid_threshold = solid_threshold
 
+        # color lookup tables
+        self._tab20 = _tab20_colors()
+        self._skeleton = None
+        self._skel_arr = None
+        self._skel_colors = None
+
         LOG.debug('color connections = %s, lw = %d, marker = %d',
                   self.color_connections, self.linewidth, self.markersize)
         
         self.framecount = 0
         self.fallcount = 0
         self.centroid = -1
+        self._fallcount_text = None
+        self._fallcount_ax = None
+
+        # label artists recycled across frames by annotations()
+        self._label_pool = []
+        self._label_ax = None
+        self._free_labels = None
         
         self.ct = core.CentroidTracker()
         self.falls = core.FallDetector()
@@ -175,27 +229,14 @@ class KeypointPainter:
         
         self.imgwriter = core.ImgWriter()
     
-    def _draw_skeleton(self, ax, x, y, v, x_, y_, w_, h_, *, skeleton, color=None, **kwargs):
+    def _draw_skeleton(self, skeletons, x, y, v, x_=None, y_=None, w_=None, h_=None, *,
+                       skeleton, color=None, **kwargs):
         if not np.any(v > 0):
             return
 
-        if x[5] != 0 and x[6] == 0:
-            mid_x = x[5]
-        elif x[5] == 0 and x[6] != 0:
-            mid_x = x[6]
-        elif x[5] != 0 and x[6] != 0:
-            mid_x = (x[5]+x[6])/2
-        else:
-            mid_x = 0
-            
-        if y[5] != 0 and y[6] == 0:
-            mid_y = y[5]
-        elif y[5] == 0 and y[6] != 0:
-            mid_y = y[6]
-        elif y[5] != 0 and y[6] != 0:
-            mid_y = (y[5]+y[6])/2
-        else:
-            mid_y = 0
+        # mean of the non-zero shoulder coordinates, 0 if both are missing
+        mid_x = x[5:7].sum() / max(np.count_nonzero(x[5:7]), 1)
+        mid_y = y[5:7].sum() / max(np.count_nonzero(y[5:7]), 1)
         
         if mid_x != 0 and mid_y != 0:
             self.centroid = (mid_x, mid_y, x_, y_, w_, h_)
@@ -206,42 +247,72 @@ class KeypointPainter:
         # return
     
         # connections
-        lines, line_colors, line_styles = [], [], []
-        for ci, (j1i, j2i) in enumerate(np.array(skeleton) - 1):
-            c = color
-            if self.color_connections:
-                c = matplotlib.cm.get_cmap('tab20')(ci / len(skeleton))
-            if v[j1i] > 0 and v[j2i] > 0:
-                lines.append([(x[j1i], y[j1i]), (x[j2i], y[j2i])])
-                line_colors.append(c)
-                if v[j1i] > self.solid_threshold and v[j2i] > self.solid_threshold:
-                    line_styles.append('solid')
-                else:
-                    line_styles.append('dashed')
-        ax.add_collection(matplotlib.collections.LineCollection(
-            lines, colors=line_colors,
-            linewidths=kwargs.get('linewidth', self.linewidth),
-            linestyles=kwargs.get('linestyle', line_styles),
-            capstyle='round',
-        ))
+        if skeleton is not self._skeleton:
+            self._skeleton = skeleton
+            self._skel_arr = np.asarray(skeleton, dtype=np.intp).reshape(-1, 2) - 1
+            self._skel_colors = matplotlib.cm.get_cmap('tab20')(
+                np.arange(len(self._skel_arr)) / len(self._skel_arr))
+        skel = self._skel_arr
+        j1, j2 = skel[:, 0], skel[:, 1]
+        mask = (v[j1] > 0) & (v[j2] > 0)
+        solid = (v[j1] > self.solid_threshold) & (v[j2] > self.solid_threshold)
+        lines = np.stack([
+            np.stack([x[j1], y[j1]], -1),
+            np.stack([x[j2], y[j2]], -1),
+        ], 1)[mask]
+        line_styles = np.where(solid[mask], 'solid', 'dashed').tolist()
+        if self.color_connections:
+            line_colors = list(self._skel_colors[mask])
+        else:
+            line_colors = [color] * len(lines)
+        if 'linestyle' in kwargs:
+            line_styles = [kwargs['linestyle']] * len(lines)
+        linewidths = [kwargs.get('linewidth', self.linewidth)] * len(lines)
 
         # joints
-        ax.scatter(
-            x[v > 0.0], y[v > 0.0], s=self.markersize**2, marker='.',
-            color='white' if self.color_connections else color,
-            edgecolor='k' if self.highlight_invisible else None,
-            zorder=2,
-        )
+        joint_color = 'white' if self.color_connections else color
+        joints_x, joints_y = [x[v > 0.0]], [y[v > 0.0]]
 
         # highlight joints
         if self.highlight is not None:
             highlight_v = np.zeros_like(v)
             highlight_v[self.highlight] = 1
             highlight_v = np.logical_and(v, highlight_v)
-
+            joints_x.append(x[highlight_v])
+            joints_y.append(y[highlight_v])
+
+        joints_x = np.concatenate(joints_x)
+        joints_y = np.concatenate(joints_y)
+        skeletons.append((lines, line_colors, line_styles, linewidths,
+                          joints_x, joints_y, [joint_color] * len(joints_x)))
+
+    def _draw_skeletons(self, ax, skeletons):
+        lines, line_colors, line_styles, linewidths = [], [], [], []
+        joints_x, joints_y, joint_colors = [], [], []
+        for s_lines, s_colors, s_styles, s_widths, s_x, s_y, s_joint_colors in skeletons:
+            lines.append(s_lines)
+            line_colors += s_colors
+            line_styles += s_styles
+            linewidths += s_widths
+            joints_x.append(s_x)
+            joints_y.append(s_y)
+            joint_colors += s_joint_colors
+
+        if line_colors:
+            # skeleton segments are mostly diagonal: skip pixel snapping
+            ax.add_collection(matplotlib.collections.LineCollection(
+                np.concatenate(lines), colors=line_colors,
+                linewidths=linewidths,
+                linestyles=line_styles,
+                capstyle='round',
+                snap=False,
+            ))
+
+        if joint_colors:
             ax.scatter(
-                x[highlight_v], y[highlight_v], s=self.markersize**2, marker='.',
-                color='white' if self.color_connections else color,
+                np.concatenate(joints_x), np.concatenate(joints_y),
+                s=self.markersize**2, marker='.',
+                color=joint_colors,
                 edgecolor='k' if self.highlight_invisible else None,
                 zorder=2,
             )
@@ -254,19 +325,22 @@ class KeypointPainter:
         if color is None and colors is None:
             colors = range(len(keypoint_sets))
 
-        for i, kps in enumerate(np.asarray(keypoint_sets)):
+        skeletons = []
+        for i, kps in enumerate(np.asarray(keypoint_sets, dtype=np.float32)):
             assert kps.shape[1] == 3
-            x = kps[:, 0] * self.xy_scale
-            y = kps[:, 1] * self.xy_scale
             v = kps[:, 2]
+            if not np.any(v > 0):
+                continue
+            xy = kps[:, 0:2] * self.xy_scale
+            x, y = xy[:, 0], xy[:, 1]
 
             if colors is not None:
                 color = colors[i]
 
             if isinstance(color, (int, np.integer)):
-                color = matplotlib.cm.get_cmap('tab20')((color % 20 + 0.05) / 20)
+                color = self._tab20[color % 20]
 
-            self._draw_skeleton(ax, x, y, v, skeleton=skeleton, color=color)
+            self._draw_skeleton(skeletons, x, y, v, skeleton=skeleton, color=color)
             if self.show_box:
                 score = scores[i] if scores is not None else None
                 self._draw_box(ax, x, y, v, color, score)
@@ -274,6 +348,8 @@ class KeypointPainter:
             if texts is not None:
                 self._draw_text(ax, x, y, v, texts[i], color)
 
+        self._draw_skeletons(ax, skeletons)
+
     @staticmethod
     def _draw_box(ax, x, y, w, h, color, score=None, linewidth=1):
         ax.add_patch(
@@ -283,38 +359,62 @@ class KeypointPainter:
         if score:
             ax.text(x, y - linewidth, '{:.4f}'.format(score), fontsize=8, color=color)
 
-    @staticmethod
-    def _draw_text(ax, x, y, v, text, color, *, subtext=None):
+    def _draw_text(self, ax, x, y, v, text, color, *, subtext=None):
         if not np.any(v > 0):
             return
 
-        coord_i = np.argsort(y[v > 0])
-        if np.sum(v) >= 2 and y[v > 0][coord_i[1]] < y[v > 0][coord_i[0]] + 10:
+        # top two visible keypoints without sorting, invisible ones pushed to inf
+        y_visible = np.where(v > 0, y, np.inf)
+        if np.sum(v) >= 2 and len(y) >= 2:
+            i0, i1 = np.argpartition(y_visible, 1)[:2]
+        else:
+            i0 = i1 = np.argmin(y_visible)
+        if i1 != i0 and y_visible[i1] < y_visible[i0] + 10:
             # second coordinate within 10 pixels
-            f0 = 0.5 + 0.5 * (y[v > 0][coord_i[1]] - y[v > 0][coord_i[0]]) / 10.0
-            coord_y = f0 * y[v > 0][coord_i[0]] + (1.0 - f0) * y[v > 0][coord_i[1]]
-            coord_x = f0 * x[v > 0][coord_i[0]] + (1.0 - f0) * x[v > 0][coord_i[1]]
+            f0 = 0.5 + 0.5 * (y[i1] - y[i0]) / 10.0
+            coord_y = f0 * y[i0] + (1.0 - f0) * y[i1]
+            coord_x = f0 * x[i0] + (1.0 - f0) * x[i1]
         else:
-            coord_y = y[v > 0][coord_i[0]]
-            coord_x = x[v > 0][coord_i[0]]
+            coord_y = y[i0]
+            coord_x = x[i0]
 
-        ax.annotate(
-            text,
-            (coord_x, coord_y),
-            fontsize=8,
-            xytext=(5.0, 5.0),
-            textcoords='offset points',
-            color='white', bbox={'facecolor': color, 'alpha': 0.5, 'linewidth': 0},
-        )
+        # subtext goes on a line above the text within the same artist
         if subtext is not None:
-            ax.annotate(
-                subtext,
-                (coord_x, coord_y),
-                fontsize=5,
-                xytext=(5.0, 18.0 + 3.0),
+            text = '{}\n{}'.format(subtext, text)
+        self._draw_label(ax, text, (coord_x, coord_y), color)
+
+    def _reset_labels(self, ax):
+        if ax is not self._label_ax:
+            self._label_pool = []
+            self._label_ax = ax
+        # labels still on the axes come from an earlier call and are left alone
+        children = set(ax.get_children())
+        self._free_labels = [label for label in self._label_pool if label not in children]
+
+    def _release_labels(self):
+        self._free_labels = None
+
+    def _draw_label(self, ax, text, xy, color):
+        if not self._free_labels:
+            label = ax.annotate(
+                text,
+                xy,
+                fontsize=8,
+                xytext=(5.0, 5.0),
                 textcoords='offset points',
+                clip_on=False,
                 color='white', bbox={'facecolor': color, 'alpha': 0.5, 'linewidth': 0},
             )
+            if self._free_labels is not None:
+                self._label_pool.append(label)
+            return
+
+        # re-attach a label that was cleared from the axes
+        label = self._free_labels.pop()
+        label.set_text(text)
+        label.xy = xy
+        label.get_bbox_patch().set_facecolor(color)
+        ax.add_artist(label)
 
     @staticmethod
     def _draw_scales(ax, xs, ys, vs, color, scales):
@@ -348,14 +448,24 @@ class KeypointPainter:
         
         ax.text(x - linewidth*2, y - linewidth*2, ID, fontsize=8)
     
-    @staticmethod
-    def _draw_fallcount(ax, fallcount):
-        print("DEBUG: Attempting to draw fall count:", fallcount)
-        ax.text(0, 0.9, "Fall Count: {}".format(fallcount), fontsize=16, color='black', transform=ax.transAxes, bbox={'facecolor': 'white', 'alpha': 0.5, 'linewidth': 0, 'pad': 0.1})
+    def _draw_fallcount(self, ax, fallcount):
+        LOG.debug('drawing fall count %d', fallcount)
+
+        # the overlay is created once per axes and only updated afterwards
+        if self._fallcount_text is None or self._fallcount_ax is not ax:
+            self._fallcount_text = matplotlib.text.Text(0, 0.9, '', fontsize=16, color='black', transform=ax.transAxes, clip_on=False, bbox={'facecolor': 'white', 'alpha': 0.5, 'linewidth': 0, 'pad': 0.1})
+            self._fallcount_ax = ax
+        self._fallcount_text.set_text("Fall Count: {}".format(fallcount))
+
+        # re-attach after the axes was cleared for the next frame
+        if self._fallcount_text not in ax.get_children():
+            ax.add_artist(self._fallcount_text)
         
     def annotations(self, ax, annotations, stream, fps, *,
                     color=None, colors=None, texts=None, subtexts=None):
         centroids = []
+        skeletons = []
+        self._reset_labels(ax)
         
         for i, ann in enumerate(annotations):
             self.centroid = -1
@@ -366,26 +476,30 @@ class KeypointPainter:
             elif hasattr(ann, 'id_'):
                 color = ann.id_
 
+            score = ann.score()
             text = None
             text_is_score = False
             if texts is not None:
                 text = texts[i]
             elif hasattr(ann, 'id_'):
                 text = '{}'.format(ann.id_)
-            elif ann.score():
-                text = '{:.0%}'.format(ann.score())
+            elif score:
+                text = '{:.0%}'.format(score)
                 text_is_score = True
 
             subtext = None
             if subtexts is not None:
                 subtext = subtexts[i]
-            elif not text_is_score and ann.score():
-                subtext = '{:.0%}'.format(ann.score())
+            elif not text_is_score and score:
+                subtext = '{:.0%}'.format(score)
 
-            self.annotation(ax, ann, color=color, text=text, subtext=subtext)
+            self._annotation(ax, skeletons, ann, color=color, text=text, subtext=subtext)
             
             if self.centroid != -1:
                 centroids.append(self.centroid)
+
+        self._draw_skeletons(ax, skeletons)
+        self._release_labels()
             
         self.persons = self.ct.update(centroids, fps)
         
@@ -395,9 +509,9 @@ class KeypointPainter:
         # fall detection
         self.fallen = self.falls.update(self.persons, self.framecount, fps)
         
-        for ID, (x_, y_, w_, h_) in self.fallen.items():
-            self._draw_box(ax, x_, y_, w_, h_, color='red')
-            
+        _draw_boxes(ax, list(self.fallen.values()), 'red')
+
+        for ID in self.fallen:
             if ID not in self.prev_fallen:
                 self.fallcount += 1
                 LOG.info("FALL COUNT: {}".format(self.fallcount))
@@ -407,23 +521,30 @@ class KeypointPainter:
         
         self.prev_fallen = self.fallen
         
-        print("DEBUG: About to call _draw_fallcount with fallcount =", self.fallcount)
         self._draw_fallcount(ax, self.fallcount)
         self.framecount += 1
         
         return self.fallcount
 
     def annotation(self, ax, ann, *, color=None, text=None, subtext=None):
+        skeletons = []
+        self._annotation(ax, skeletons, ann, color=color, text=text, subtext=subtext)
+        self._draw_skeletons(ax, skeletons)
+
+    def _annotation(self, ax, skeletons, ann, *, color=None, text=None, subtext=None):
         if color is None:
             color = 0
         if isinstance(color, (int, np.integer)):
-            color = matplotlib.cm.get_cmap('tab20')((color % 20 + 0.05) / 20)
+            color = self._tab20[color % 20]
 
-        kps = ann.data
+        # float32 is precise enough for drawing and halves the data touched per frame
+        kps = np.ascontiguousarray(ann.data, dtype=np.float32)
         assert kps.shape[1] == 3
-        x = kps[:, 0] * self.xy_scale
-        y = kps[:, 1] * self.xy_scale
         v = kps[:, 2]
+        if not np.any(v > 0):
+            return
+        xy = kps[:, 0:2] * self.xy_scale
+        x, y = xy[:, 0], xy[:, 1]
 
         if self.show_frontier_order:
             frontier = set((s, e) for s, e in ann.frontier_order)
@@ -432,7 +553,7 @@ class KeypointPainter:
                 for s, e in ann.skeleton
             ]
             frontier_skeleton = [se for se, m in zip(ann.skeleton, frontier_skeleton_mask) if m]
-            self._draw_skeleton(ax, x, y, v, color='black', skeleton=frontier_skeleton,
+            self._draw_skeleton(skeletons, x, y, v, color='black', skeleton=frontier_skeleton,
                                 linestyle='dotted', linewidth=1)
 
         skeleton = ann.skeleton
@@ -456,7 +577,7 @@ class KeypointPainter:
         self.subject_width = w_
         self.subject_height = h_
 
-        self._draw_skeleton(ax, x, y, v, x_, y_, w_, h_, color=color, skeleton=skeleton)
+        self._draw_skeleton(skeletons, x, y, v, x_, y_, w_, h_, color=color, skeleton=skeleton)
 
         if self.show_joint_scales and ann.joint_scales is not None:
             self._draw_scales(ax, x, y, v, color, ann.joint_scales)
@@ -249,7 +249,7 @@ def inference(args, stream):
                 except Exception as e:
                     print("❌ Error sending notification:", e)
             
-            ax.text(0, 0.9, "Fall Count: {}".format(fallcount), fontsize=16, color='black', transform=ax.transAxes, bbox={'facecolor': 'white', 'alpha': 0.5, 'linewidth': 0, 'pad': 0.1})
+            # the fall count overlay is drawn by the keypoint painter
             old_fallcount = fallcount
 
         else: